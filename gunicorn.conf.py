@@ -0,0 +1,39 @@
+# gunicorn.conf.py
+# Multi-worker server that shares the spaCy model between workers.
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported once in the master (preload_app), which loads spaCy, the
+# compiled regexes and the skill tables. Workers are then forked and share those
+# pages copy-on-write instead of each loading its own copy.
+import gc
+import os
+
+from app.database import Database
+from app.main import DATABASE_URL
+from app.utils import get_memory_usage
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Reference counting still writes to shared objects, but the cyclic GC would also
+# touch every tracked object and un-share its page. Keep it off while preloading,
+# then freeze the preloaded objects so workers never scan them.
+gc.disable()
+
+
+def when_ready(server):
+    # migrate and sign any unindexed resumes once here, not in every worker
+    Database(DATABASE_URL).engine.dispose()
+    gc.freeze()
+    server.log.info("Master memory after preload: %s", get_memory_usage())
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    worker.log.info("Worker memory: %s", get_memory_usage())
@@ -1,8 +1,13 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Set, Tuple
+from array import array
+from datetime import datetime
 import sqlalchemy as sa
-from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.exc import DatabaseError, IntegrityError
+from sqlalchemy.orm import aliased, sessionmaker, declarative_base, Session
 import json
 
+from app.dedup import NearDuplicateIndex, minhash_signature
+
 Base = declarative_base()
 
 
@@ -14,15 +19,183 @@ class ParsedResumeORM(Base):
     path = sa.Column(sa.String)
     raw_text = sa.Column(sa.Text)
     parsed_json = sa.Column(sa.Text)
+    created_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+
+
+class ResumeSignatureORM(Base):
+    __tablename__ = "resume_signatures"
+
+    resume_id = sa.Column(sa.String, primary_key=True)
+    signature = sa.Column(sa.LargeBinary)   # MinHash values, array("I").tobytes()
+    created_at = sa.Column(sa.DateTime)
+
+
+class ResumeBucketORM(Base):
+    __tablename__ = "resume_lsh_buckets"
+
+    band = sa.Column(sa.Integer, primary_key=True)
+    key = sa.Column(sa.BigInteger, primary_key=True)
+    resume_id = sa.Column(sa.String, primary_key=True, index=True)
+
+
+def _batches(ids: Iterable[str], size: int = 500) -> Iterator[List[str]]:
+    # keep IN (...) lists under SQLite's bound-parameter limit
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _load_signature(blob: bytes) -> array:
+    sig = array("I")
+    sig.frombytes(blob)
+    return sig
+
+
+class SQLNearDuplicateIndex(NearDuplicateIndex):
+    """
+    NearDuplicateIndex whose signatures and LSH buckets live in the database,
+    so every worker process sees the same clusters and nothing is held in memory.
+    """
+
+    WRITE_ATTEMPTS = 3
+
+    def __init__(self, session_factory: sessionmaker, **kwargs):
+        super().__init__(**kwargs)
+        self.Session = session_factory
+
+    def _count(self) -> int:
+        session = self.Session()
+        try:
+            return session.query(sa.func.count(ResumeSignatureORM.resume_id)).scalar()
+        finally:
+            session.close()
+
+    def _signature(self, resume_id: str) -> Optional[array]:
+        session = self.Session()
+        try:
+            blob = (
+                session.query(ResumeSignatureORM.signature)
+                .filter_by(resume_id=resume_id)
+                .scalar()
+            )
+            return _load_signature(blob) if blob is not None else None
+        finally:
+            session.close()
+
+    def _replace(self, resume_id: str, sig: array, created_at: datetime, keys: List[Tuple[int, int]]):
+        # delete + insert in one transaction, so re-signing an id (backfill racing a save,
+        # two workers starting together) never leaves it half-written or hits the primary key.
+        # A concurrent writer can still commit the same rows first; then retry over its rows.
+        for attempt in range(self.WRITE_ATTEMPTS):
+            session = self.Session()
+            try:
+                session.query(ResumeBucketORM).filter_by(resume_id=resume_id).delete()
+                session.query(ResumeSignatureORM).filter_by(resume_id=resume_id).delete()
+                session.add(ResumeSignatureORM(
+                    resume_id=resume_id, signature=sig.tobytes(), created_at=created_at
+                ))
+                session.add_all(
+                    ResumeBucketORM(band=band, key=key, resume_id=resume_id) for band, key in keys
+                )
+                session.commit()
+                return
+            except IntegrityError:
+                session.rollback()
+                if attempt == self.WRITE_ATTEMPTS - 1:
+                    raise
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+
+    def _delete(self, resume_id: str):
+        session = self.Session()
+        try:
+            session.query(ResumeBucketORM).filter_by(resume_id=resume_id).delete()
+            session.query(ResumeSignatureORM).filter_by(resume_id=resume_id).delete()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def _candidates(self, keys: List[Tuple[int, int]]) -> Set[str]:
+        session = self.Session()
+        try:
+            rows = (
+                session.query(ResumeBucketORM.resume_id)
+                .filter(sa.tuple_(ResumeBucketORM.band, ResumeBucketORM.key).in_(keys))
+                .distinct()
+                .all()
+            )
+            return {r.resume_id for r in rows}
+        finally:
+            session.close()
+
+    def _candidate_pairs(self, resume_ids: Iterable[str]) -> Dict[str, Set[str]]:
+        # one self-join on the bucket table per batch instead of a lookup per id
+        mine = aliased(ResumeBucketORM)
+        other = aliased(ResumeBucketORM)
+        pairs: Dict[str, Set[str]] = {}
+        session = self.Session()
+        try:
+            for batch in _batches(resume_ids):
+                rows = (
+                    session.query(mine.resume_id, other.resume_id)
+                    .join(other, sa.and_(mine.band == other.band, mine.key == other.key,
+                                         mine.resume_id != other.resume_id))
+                    .filter(mine.resume_id.in_(batch))
+                    .distinct()
+                    .all()
+                )
+                for rid, candidate in rows:
+                    pairs.setdefault(rid, set()).add(candidate)
+            return pairs
+        finally:
+            session.close()
+
+    def _signatures_for(self, resume_ids: Iterable[str]) -> Dict[str, array]:
+        session = self.Session()
+        try:
+            found = {}
+            for batch in _batches(resume_ids):
+                rows = (
+                    session.query(ResumeSignatureORM.resume_id, ResumeSignatureORM.signature)
+                    .filter(ResumeSignatureORM.resume_id.in_(batch))
+                    .all()
+                )
+                found.update((r.resume_id, _load_signature(r.signature)) for r in rows)
+            return found
+        finally:
+            session.close()
+
+    def _created_for(self, resume_ids: Iterable[str]) -> Dict[str, datetime]:
+        session = self.Session()
+        try:
+            found = {}
+            for batch in _batches(resume_ids):
+                rows = (
+                    session.query(ResumeSignatureORM.resume_id, ResumeSignatureORM.created_at)
+                    .filter(ResumeSignatureORM.resume_id.in_(batch))
+                    .all()
+                )
+                found.update((r.resume_id, r.created_at) for r in rows)
+            return found
+        finally:
+            session.close()
 
 
 class ParsedResume:
-    def __init__(self, id: str, filename: str, path: str, raw_text: str, parsed: Dict[str, Any]):
+    def __init__(self, id: str, filename: str, path: str, raw_text: str, parsed: Dict[str, Any],
+                 created_at: Optional[datetime] = None):
         self.id = id
         self.filename = filename
         self.path = path
         self.raw_text = raw_text
         self.parsed = parsed
+        self.created_at = created_at or datetime.utcnow()
 
     def to_dict(self):
         return {
@@ -30,7 +203,8 @@ class ParsedResume:
             "filename": self.filename,
             "path": self.path,
             "raw_text": self.raw_text,
-            "parsed": self.parsed
+            "parsed": self.parsed,
+            "created_at": self.created_at.isoformat()
         }
 
 
@@ -39,26 +213,95 @@ class Database:
         self.engine = sa.create_engine(
             url, connect_args={"check_same_thread": False}
         )
-        Base.metadata.create_all(self.engine)
+        self._create_schema()
         self.Session = sessionmaker(bind=self.engine, autocommit=False, autoflush=False)
 
-    def save_resume(self, resume: ParsedResume):
-        session = self.Session()
-        try:
-            row = ParsedResumeORM(
-                id=resume.id,
-                filename=resume.filename,
-                path=resume.path,
-                raw_text=resume.raw_text,
-                parsed_json=json.dumps(resume.parsed, default=str)
-            )
-            session.merge(row)
-            session.commit()
-        except Exception as e:
-            session.rollback()
-            raise e
-        finally:
-            session.close()
+        # near-duplicate signatures are persisted, so every process shares one index;
+        # only rows saved before the index existed need signing here
+        self.duplicates = SQLNearDuplicateIndex(self.Session)
+        self._backfill_duplicate_index()
+
+    def _create_schema(self, attempts: int = 3):
+        # several workers can open a fresh store at once; whoever loses a CREATE/ALTER
+        # race retries, and the re-check then finds the schema already in place
+        for attempt in range(attempts):
+            try:
+                Base.metadata.create_all(self.engine)
+                self._migrate()
+                return
+            except DatabaseError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _migrate(self):
+        # create_all does not alter existing tables; add columns introduced after the first release
+        columns = {c["name"] for c in sa.inspect(self.engine).get_columns("resumes")}
+        if "created_at" not in columns:
+            with self.engine.begin() as conn:
+                conn.execute(sa.text("ALTER TABLE resumes ADD COLUMN created_at TIMESTAMP"))
+                # rows from before the migration all count as older than anything saved after it
+                conn.execute(
+                    sa.update(ParsedResumeORM.__table__).values(created_at=datetime.utcnow())
+                )
+
+    def _backfill_duplicate_index(self, chunk_size: int = 500):
+        """
+        Sign stored resumes that have no signature yet. Texts too short to sign never
+        get one, so they are re-checked on each startup; that is cheap.
+        """
+        last_id = None
+        while True:
+            session = self.Session()
+            try:
+                query = (
+                    session.query(ParsedResumeORM.id, ParsedResumeORM.raw_text, ParsedResumeORM.created_at)
+                    .outerjoin(ResumeSignatureORM, ResumeSignatureORM.resume_id == ParsedResumeORM.id)
+                    .filter(ResumeSignatureORM.resume_id.is_(None))
+                )
+                if last_id is not None:
+                    query = query.filter(ParsedResumeORM.id > last_id)
+                rows = query.order_by(ParsedResumeORM.id).limit(chunk_size).all()
+            finally:
+                session.close()
+
+            if not rows:
+                return
+            for rid, raw_text, created_at in rows:
+                self.duplicates.add(rid, raw_text or "", created_at)
+            last_id = rows[-1].id
+
+    def save_resume(self, resume: ParsedResume, signature: Optional[array] = None):
+        """
+        Store resume and index its text for near-duplicate detection. Pass a signature
+        from app.dedup.minhash_signature to skip computing it here (it is CPU heavy).
+        """
+        if signature is None:
+            signature = minhash_signature(resume.raw_text or "")
+        for attempt in range(self.duplicates.WRITE_ATTEMPTS):
+            session = self.Session()
+            try:
+                row = ParsedResumeORM(
+                    id=resume.id,
+                    filename=resume.filename,
+                    path=resume.path,
+                    raw_text=resume.raw_text,
+                    parsed_json=json.dumps(resume.parsed, default=str),
+                    created_at=resume.created_at
+                )
+                session.merge(row)
+                session.commit()
+                break
+            except IntegrityError:
+                # merge is select-then-insert; a concurrent save of the same id won the insert
+                session.rollback()
+                if attempt == self.duplicates.WRITE_ATTEMPTS - 1:
+                    raise
+            except Exception as e:
+                session.rollback()
+                raise e
+            finally:
+                session.close()
+        self.duplicates.add_signature(resume.id, signature, resume.created_at)
 
     def get_resume(self, id: str) -> Optional[ParsedResume]:
         session = self.Session()
@@ -73,20 +316,85 @@ class Database:
                 filename=row.filename,
                 path=row.path,
                 raw_text=row.raw_text,
-                parsed=json.loads(row.parsed_json)
+                parsed=json.loads(row.parsed_json),
+                created_at=row.created_at
             )
         finally:
             session.close()
 
-    def search_by_text(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+    def search_by_text(self, query: str, limit: int = 10,
+                       collapse_duplicates: bool = False) -> List[Dict[str, str]]:
+        """
+        Resumes whose raw text contains query. With collapse_duplicates, each
+        near-duplicate cluster is represented by its newest version that matches
+        the query (a newer version without the term is not returned).
+        """
         session = self.Session()
         try:
-            rows = (
-                session.query(ParsedResumeORM)
+            base = (
+                session.query(ParsedResumeORM.id, ParsedResumeORM.filename)
                 .filter(ParsedResumeORM.raw_text.ilike(f"%{query}%"))
-                .limit(limit)
-                .all()
             )
-            return [{"id": r.id, "filename": r.filename} for r in rows]
+            if not collapse_duplicates:
+                return [{"id": r.id, "filename": r.filename} for r in base.limit(limit).all()]
+
+            # newest first, so the first match seen from a cluster is its newest matching
+            # version; collapsing drops rows, so keep reading until the limit is filled
+            seen_clusters = set()
+            results = []
+            rows = base.order_by(ParsedResumeORM.created_at.desc(), ParsedResumeORM.id.desc()).yield_per(limit * 2)
+            for r in rows:
+                cluster_key = self.duplicates.newest(r.id)
+                if cluster_key in seen_clusters:
+                    continue
+                seen_clusters.add(cluster_key)
+                results.append({"id": r.id, "filename": r.filename})
+                if len(results) >= limit:
+                    break
+            return results
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    def iter_resumes(self, chunk_size: int = 100, include_raw_text: bool = False) -> Iterator[ParsedResume]:
+        """
+        Yield stored resumes ordered by id, reading chunk_size rows per query.
+        Each chunk uses its own short session (keyset pagination), so a slow consumer
+        never holds a connection open. raw_text is only loaded when asked for.
+        """
+        columns = [
+            ParsedResumeORM.id,
+            ParsedResumeORM.filename,
+            ParsedResumeORM.path,
+            ParsedResumeORM.parsed_json,
+            ParsedResumeORM.created_at,
+        ]
+        if include_raw_text:
+            columns.append(ParsedResumeORM.raw_text)
+
+        last_id = None
+        while True:
+            session = self.Session()
+            try:
+                query = session.query(*columns)
+                if last_id is not None:
+                    query = query.filter(ParsedResumeORM.id > last_id)
+                rows = query.order_by(ParsedResumeORM.id).limit(chunk_size).all()
+            finally:
+                session.close()
+
+            if not rows:
+                return
+            for row in rows:
+                yield ParsedResume(
+                    id=row.id,
+                    filename=row.filename,
+                    path=row.path,
+                    raw_text=row.raw_text if include_raw_text else None,
+                    parsed=json.loads(row.parsed_json),
+                    created_at=row.created_at
+                )
+            last_id = rows[-1].id
+
+    def get_duplicates(self, id: str) -> List[str]:
+        """Ids in the same near-duplicate cluster as id (including id), newest first."""
+        return self.duplicates.cluster(id)
\ No newline at end of file
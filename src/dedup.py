@@ -0,0 +1,230 @@
+# app/dedup.py
+import re
+import zlib
+import random
+import hashlib
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Near-duplicate detection for resume text.
+# - MinHash signatures approximate Jaccard similarity between word shingles
+# - LSH banding buckets signatures so lookups only touch likely duplicates
+# - Clusters are the connected components of verified near-duplicate pairs
+# Signatures are kept as compact unsigned arrays; nothing else per-resume is stored.
+# NearDuplicateIndex keeps everything in memory; storage goes through a few _hooks
+# so app.database can keep the same index in SQL, shared by all workers.
+
+NUM_PERM = 128
+BANDS = 32              # BANDS * ROWS must equal NUM_PERM
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MIN_SHINGLES = 10       # shorter texts (e.g. failed extraction) are too weak to compare
+THRESHOLD = 0.8         # estimated Jaccard needed to call two resumes duplicates
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"[a-z0-9@.+#]+")
+
+# fixed seed so signatures are stable across processes and restarts
+_rng = random.Random(1)
+_PERMS: List[Tuple[int, int]] = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERM)
+]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hashed word n-grams of normalized text (case, punctuation and spacing ignored)."""
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    return {
+        zlib.crc32(" ".join(tokens[i:i + size]).encode())
+        for i in range(len(tokens) - size + 1)
+    }
+
+
+def minhash_signature(text: str) -> Optional[array]:
+    """128 x 32-bit MinHash values, or None when the text has fewer than MIN_SHINGLES shingles."""
+    text_shingles = shingles(text)
+    if len(text_shingles) < MIN_SHINGLES:
+        return None
+    sig = array("I", [_MAX_HASH] * NUM_PERM)
+    for h in text_shingles:
+        for i, (a, b) in enumerate(_PERMS):
+            v = ((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH
+            if v < sig[i]:
+                sig[i] = v
+    return sig
+
+
+def estimated_similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def band_keys(sig: array) -> List[Tuple[int, int]]:
+    """(band, key) per LSH band. Keys are stable across processes and fit a signed 64-bit column."""
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "big", signed=True)))
+    return keys
+
+
+class NearDuplicateIndex:
+    """
+    Incremental MinHash/LSH index over resume text.
+    Call add() on every save; re-adding an id replaces its previous signature.
+    Texts too short to sign are not indexed and always form a cluster of their own.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self._signatures: Dict[str, array] = {}
+        self._created: Dict[str, datetime] = {}
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+
+    # -------- storage hooks (overridden by the SQL-backed index) --------
+    def _count(self) -> int:
+        return len(self._signatures)
+
+    def _signature(self, resume_id: str) -> Optional[array]:
+        return self._signatures.get(resume_id)
+
+    def _replace(self, resume_id: str, sig: array, created_at: datetime, keys: List[Tuple[int, int]]):
+        """Store sig for resume_id, dropping any previous entry. Must be atomic and idempotent."""
+        self._delete(resume_id)
+        self._signatures[resume_id] = sig
+        self._created[resume_id] = created_at
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(resume_id)
+
+    def _delete(self, resume_id: str):
+        sig = self._signatures.pop(resume_id, None)
+        self._created.pop(resume_id, None)
+        if sig is None:
+            return
+        for key in band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.discard(resume_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def _candidates(self, keys: List[Tuple[int, int]]) -> Set[str]:
+        found: Set[str] = set()
+        for key in keys:
+            found |= self._buckets.get(key, set())
+        return found
+
+    def _candidate_pairs(self, resume_ids: Iterable[str]) -> Dict[str, Set[str]]:
+        """For each indexed id, the other ids sharing at least one LSH bucket with it."""
+        pairs: Dict[str, Set[str]] = {}
+        for rid in resume_ids:
+            sig = self._signatures.get(rid)
+            if sig is not None:
+                pairs[rid] = self._candidates(band_keys(sig)) - {rid}
+        return pairs
+
+    def _signatures_for(self, resume_ids: Iterable[str]) -> Dict[str, array]:
+        return {rid: self._signatures[rid] for rid in resume_ids if rid in self._signatures}
+
+    def _created_for(self, resume_ids: Iterable[str]) -> Dict[str, datetime]:
+        return {rid: self._created[rid] for rid in resume_ids if rid in self._created}
+
+    # -------- index operations --------
+    def __len__(self) -> int:
+        return self._count()
+
+    def __contains__(self, resume_id: str) -> bool:
+        return self._signature(resume_id) is not None
+
+    def add(self, resume_id: str, text: str, created_at: Optional[datetime] = None):
+        self.add_signature(resume_id, minhash_signature(text), created_at)
+
+    def add_signature(self, resume_id: str, sig: Optional[array], created_at: Optional[datetime] = None):
+        """
+        Index a signature computed elsewhere (e.g. off the event loop or in a process pool).
+        None, as returned by minhash_signature for unsignable text, removes the id.
+        """
+        if sig is None:
+            self._delete(resume_id)
+            return
+        self._replace(resume_id, sig, created_at or datetime.utcnow(), band_keys(sig))
+
+    def remove(self, resume_id: str):
+        self._delete(resume_id)
+
+    def near_duplicates(self, resume_id: str) -> List[str]:
+        """Ids whose estimated similarity to resume_id meets the threshold."""
+        sig = self._signature(resume_id)
+        if sig is None:
+            return []
+        candidates = self._candidates(band_keys(sig))
+        candidates.discard(resume_id)
+        return [
+            rid for rid, other in self._signatures_for(candidates).items()
+            if estimated_similarity(sig, other) >= self.threshold
+        ]
+
+    def cluster(self, resume_id: str) -> List[str]:
+        """All resumes transitively near-duplicate with resume_id, newest first (ties by id)."""
+        return self.clusters([resume_id])[resume_id]
+
+    def clusters(self, resume_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        cluster() for many ids at once. The search runs breadth-first over the whole
+        batch, so storage is hit a few times per level instead of per id.
+        """
+        ids = list(dict.fromkeys(resume_ids))
+        sigs = self._signatures_for(ids)
+        neighbours: Dict[str, Set[str]] = {}
+        frontier = set(sigs)
+        while frontier:
+            pairs = self._candidate_pairs(frontier)
+            unseen = set().union(*pairs.values()) - sigs.keys() if pairs else set()
+            sigs.update(self._signatures_for(unseen))
+            for rid in frontier:
+                neighbours[rid] = {
+                    other for other in pairs.get(rid, ())
+                    if other in sigs and estimated_similarity(sigs[rid], sigs[other]) >= self.threshold
+                }
+            frontier = set().union(*neighbours.values()) - neighbours.keys()
+
+        created = self._created_for(neighbours)
+        result: Dict[str, List[str]] = {}
+        for rid in ids:
+            if rid in result:
+                continue
+            if rid not in neighbours:
+                result[rid] = [rid]
+                continue
+            seen = {rid}
+            stack = [rid]
+            while stack:
+                for dup in neighbours[stack.pop()]:
+                    if dup not in seen:
+                        seen.add(dup)
+                        stack.append(dup)
+            ordered = sorted(seen, key=lambda member: (created[member], member), reverse=True)
+            for member in seen:
+                result[member] = ordered
+        return {rid: result[rid] for rid in ids}
+
+    def newest(self, resume_id: str) -> str:
+        return self.cluster(resume_id)[0]
+
+    def collapse(self, resume_ids: Iterable[str]) -> List[str]:
+        """
+        Replace each id by the newest member of its cluster, dropping repeats.
+        Order of first appearance is preserved.
+        """
+        out: List[str] = []
+        seen: Set[str] = set()
+        for rid in resume_ids:
+            newest = self.newest(rid)
+            if newest not in seen:
+                seen.add(newest)
+                out.append(newest)
+        return out
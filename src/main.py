@@ -1,16 +1,27 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, Optional
 from pathlib import Path
+from itertools import islice
+import multiprocessing
+import threading
+import asyncio
+import json
 import shutil
 import uuid
 import os
 
-from app.parsers import extract_text_from_file, parse_resume_content
+from app.parsers import extract_text_from_file, parse_resume_content, parse_resume_in_subprocess
 from app.llm_client import LLMClient
 from app.models import ParseResultSchema
+from app.database import Database, ParsedResume
+from app.dedup import minhash_signature
+from app.utils import get_memory_usage
 
-# 🚨 In-memory storage for parsed resumes (Replace with DB later)
-DB = {}
+# ✅ Persistent storage for parsed resumes (also keeps the near-duplicate index)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./resumes.db")
 
 UPLOAD_DIR = Path("./uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -24,14 +35,76 @@ app = FastAPI(
 # ✅ API Key auth
 API_KEY = os.getenv("API_KEY", "test123")
 
-# ✅ Initialize LLM Client
-llm_client = LLMClient()
+# ✅ Optional process pool for parsing (0 = parse inside the request worker)
+PARSER_PROCESSES = int(os.getenv("PARSER_PROCESSES", "0"))
+
+# ✅ Per-process resources, created lazily so a preforking master (gunicorn
+# --preload, see gunicorn.conf.py) never hands the same sockets or pool to several workers
+_llm_client: Optional[LLMClient] = None
+_parser_pool: Optional[ProcessPoolExecutor] = None
+_db: Optional[Database] = None
+_db_lock = threading.Lock()
+_owner_pid: Optional[int] = None
+
+
+def _reset_after_fork():
+    global _llm_client, _db, _owner_pid
+    if _owner_pid != os.getpid():
+        _llm_client = None
+        _db = None
+        _owner_pid = os.getpid()
+
+
+def get_llm_client() -> LLMClient:
+    global _llm_client
+    _reset_after_fork()
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+
+def get_db() -> Database:
+    global _db
+    _reset_after_fork()
+    if _db is None:
+        # sync endpoints run in the threadpool; only one of them may open (and backfill) the DB
+        with _db_lock:
+            if _db is None:
+                _db = Database(DATABASE_URL)
+    return _db
+
+
+def get_parser_pool() -> Optional[ProcessPoolExecutor]:
+    return _parser_pool
+
+
+@app.on_event("startup")
+def start_parser_pool():
+    global _parser_pool
+    if PARSER_PROCESSES <= 0 or _parser_pool is not None:
+        return
+    # fork so pool processes inherit the already loaded spaCy model copy-on-write
+    _parser_pool = ProcessPoolExecutor(
+        max_workers=PARSER_PROCESSES,
+        mp_context=multiprocessing.get_context("fork")
+    )
+    # forking a threaded process can deadlock, so start every pool process now,
+    # before this worker has served a request (and started its threadpool)
+    _parser_pool.submit(os.getpid).result()
+
+
+@app.on_event("shutdown")
+def shutdown_parser_pool():
+    global _parser_pool
+    if _parser_pool is not None:
+        _parser_pool.shutdown(wait=False, cancel_futures=True)
+        _parser_pool = None
 
 
 # ------------------ ✅ HEALTH CHECK ------------------
 @app.get("/api/v1/health")
 def health_check():
-    return {"status": "ok", "message": "API is healthy 🚀"}
+    return {"status": "ok", "message": "API is healthy 🚀", "worker": get_memory_usage()}
 
 
 # ------------------ ✅ UPLOAD & PARSE ------------------
@@ -59,11 +132,27 @@ async def upload_resume(
         # ✅ OCR/text extraction
         text = extract_text_from_file(file_path)
 
-        # ✅ Parse with LLM client
-        parsed_data = parse_resume_content(text=text, resume_id=file_id, llm_client=llm_client)
+        # ✅ Parse with LLM client (in the process pool when one is configured)
+        pool = get_parser_pool()
+        signature = None
+        if pool is not None:
+            loop = asyncio.get_running_loop()
+            parsed_data = await loop.run_in_executor(pool, parse_resume_in_subprocess, text, file_id)
+            signature = await loop.run_in_executor(pool, minhash_signature, text)
+        else:
+            parsed_data = parse_resume_content(text=text, resume_id=file_id, llm_client=get_llm_client())
 
-        # ✅ Store in memory
-        DB[file_id] = parsed_data
+        # ✅ Persist; raw text lives in its own column so reads can skip it.
+        # MinHash signing and the DB writes run in the threadpool, off the event loop.
+        stored = {k: v for k, v in parsed_data.items() if k != "raw_text"}
+        resume = ParsedResume(
+            id=file_id,
+            filename=file.filename,
+            path=str(file_path),
+            raw_text=text,
+            parsed=stored
+        )
+        await run_in_threadpool(lambda: get_db().save_resume(resume, signature))
 
         response = ParseResultSchema(
             resume_id=file_id,
@@ -83,25 +172,89 @@ async def upload_resume(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ------------------ ✅ FIELD PROJECTION ------------------
+def parse_fields(fields: Optional[str]) -> Optional[set]:
+    """`?fields=skills,experience` -> {"skills", "experience"}; None means the default set."""
+    if not fields:
+        return None
+    return {f.strip() for f in fields.split(",") if f.strip()}
+
+
+def project_resume(resume: ParsedResume, fields: Optional[set]) -> Dict[str, Any]:
+    """Parsed fields plus `id`. raw_text is only included when explicitly requested."""
+    data = dict(resume.parsed)
+    data["id"] = resume.id
+    if fields is None:
+        return data
+    if "raw_text" in fields:
+        data["raw_text"] = resume.raw_text
+    return {k: v for k, v in data.items() if k in fields or k == "id"}
+
+
+# ------------------ ✅ LIST / EXPORT (STREAMED) ------------------
+STREAM_CHUNK_SIZE = 100
+
+
+@app.get("/api/v1/resumes")
+def list_resumes(
+    fields: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    collapse_duplicates: bool = False
+):
+    db = get_db()
+    wanted = parse_fields(fields)
+    include_raw_text = wanted is not None and "raw_text" in wanted
+
+    def records() -> Iterator[Dict[str, Any]]:
+        resumes = db.iter_resumes(chunk_size=STREAM_CHUNK_SIZE, include_raw_text=include_raw_text)
+        while True:
+            chunk = list(islice(resumes, STREAM_CHUNK_SIZE))
+            if not chunk:
+                return
+            # resolve the whole chunk's clusters in a few batched queries, not per record
+            clusters = db.duplicates.clusters(r.id for r in chunk) if collapse_duplicates else {}
+            for resume in chunk:
+                if collapse_duplicates and clusters[resume.id][0] != resume.id:
+                    continue
+                yield project_resume(resume, wanted)
+
+    # one record per line / per event, so neither side has to hold the full result set
+    if format == "sse":
+        body = (f"data: {json.dumps(r, default=str)}\n\n" for r in records())
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    body = (json.dumps(r, default=str) + "\n" for r in records())
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
 # ------------------ ✅ FETCH PARSED RESUME ------------------
 @app.get("/api/v1/resumes/{resume_id}")
-async def get_resume(resume_id: str):
-    if resume_id not in DB:
+async def get_resume(resume_id: str, fields: Optional[str] = None):
+    resume = get_db().get_resume(resume_id)
+    if resume is None:
         raise HTTPException(status_code=404, detail="Resume not found")
-    return DB[resume_id]
+    return project_resume(resume, parse_fields(fields))
 
 
 # ------------------ ✅ MATCH RESUME TO JOB ------------------
 @app.post("/api/v1/resumes/{resume_id}/match")
 async def match_resume(resume_id: str, body: dict):
-    if resume_id not in DB:
+    db = get_db()
+    resume = db.get_resume(resume_id)
+    if resume is None:
         raise HTTPException(status_code=404, detail="Resume not found")
 
     job_text = body.get("job_description", "").lower()
-    resume = DB[resume_id]
+
+    # ✅ Optionally score the newest version of this candidate's CV instead
+    if body.get("collapse_duplicates"):
+        newest_id = db.duplicates.newest(resume_id)
+        if newest_id != resume_id:
+            resume_id = newest_id
+            resume = db.get_resume(newest_id)
 
     # Extract skills safely
-    skills_list = resume.get("skills", [])
+    skills_list = resume.parsed.get("skills", [])
     if not skills_list:
         return {"resume_id": resume_id, "score": 0}
 
@@ -121,4 +274,15 @@ async def match_resume(resume_id: str, body: dict):
         matched = sum(1 for s in skills if s in job_text)
         score = round((matched / len(skills)) * 100, 2)
 
-    return {"resume_id": resume_id, "score": score}
\ No newline at end of file
+    return {"resume_id": resume_id, "score": score}
+
+
+# ------------------ ✅ NEAR-DUPLICATE CLUSTER ------------------
+@app.get("/api/v1/resumes/{resume_id}/duplicates")
+async def get_duplicates(resume_id: str):
+    db = get_db()
+    if db.get_resume(resume_id) is None:
+        raise HTTPException(status_code=404, detail="Resume not found")
+
+    cluster = db.duplicates.cluster(resume_id)
+    return {"resume_id": resume_id, "newest_id": cluster[0], "cluster": cluster}
\ No newline at end of file
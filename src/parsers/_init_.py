@@ -36,6 +36,16 @@ except OSError:
 
 EMAIL_RE = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
 PHONE_RE = re.compile(r"(\+\d{1,3}[-.\s]?)?(\d{10,12})")
+YEAR_RE = re.compile(r"\b(20|19)\d{2}\b")
+
+# Lookup tables are built once at import so a preforking server shares them with its workers
+DEFAULT_SKILLS = (
+    "python", "java", "c++", "sql", "aws", "docker", "kubernetes",
+    "nlp", "machine learning", "deep learning", "react", "node"
+)
+EDU_KEYWORDS = tuple(
+    kw.lower() for kw in ("B.Tech", "Bachelor", "Masters", "BSc", "MSc", "PhD", "Graduation")
+)
 
 
 # ------------------------------------------------------------
@@ -117,12 +127,8 @@ def extract_contact(text: str) -> Dict[str, Optional[str]]:
 
 
 def extract_skills(text: str) -> List[str]:
-    default_skills = [
-        "python", "java", "c++", "sql", "aws", "docker", "kubernetes",
-        "nlp", "machine learning", "deep learning", "react", "node"
-    ]
     text_low = text.lower()
-    return sorted({s for s in default_skills if s in text_low})
+    return sorted({s for s in DEFAULT_SKILLS if s in text_low})
 
 
 def extract_experience(text: str) -> List[WorkExperience]:
@@ -130,7 +136,7 @@ def extract_experience(text: str) -> List[WorkExperience]:
     experiences = []
 
     for i, line in enumerate(lines):
-        if re.search(r"\b(20|19)\d{2}\b", line):
+        if YEAR_RE.search(line):
             desc = " ".join(lines[i + 1:i + 4])
             experiences.append(
                 WorkExperience(
@@ -145,13 +151,13 @@ def extract_experience(text: str) -> List[WorkExperience]:
 
 
 def extract_education(text: str) -> List[Education]:
-    edu_keywords = ["B.Tech", "Bachelor", "Masters", "BSc", "MSc", "PhD", "Graduation"]
     lines = text.splitlines()
 
     education = []
     for line in lines:
-        for kw in edu_keywords:
-            if kw.lower() in line.lower():
+        line_low = line.lower()
+        for kw in EDU_KEYWORDS:
+            if kw in line_low:
                 education.append(Education(degree=line))
                 break
 
@@ -198,4 +204,22 @@ def parse_resume_content(
             pass
 
     parsed["raw_text"] = text
-    return parsed
\ No newline at end of file
+    return parsed
+
+
+# ------------------------------------------------------------
+# Process-Pool Entry Point
+# ------------------------------------------------------------
+_pool_llm_client: Optional[LLMClient] = None
+
+
+def parse_resume_in_subprocess(text: str, resume_id: str) -> Dict[str, Any]:
+    """
+    Entry point for a process-pool parsing backend. Pool processes are forked,
+    so spaCy and the tables above are inherited; only the LLM client (which holds
+    network connections) is built per process.
+    """
+    global _pool_llm_client
+    if _pool_llm_client is None:
+        _pool_llm_client = LLMClient()
+    return parse_resume_content(text=text, resume_id=resume_id, llm_client=_pool_llm_client)
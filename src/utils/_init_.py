@@ -1,9 +1,42 @@
 # app/utils.py
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()  # load .env if present
 
 
 def get_env_var(key: str, default=None):
-    return os.getenv(key, default)
\ No newline at end of file
+    return os.getenv(key, default)
+
+
+def get_memory_usage() -> dict:
+    """
+    Memory of the current process in MB.
+    rss counts shared copy-on-write pages in full; pss splits them between the
+    processes sharing them, so summing pss across workers gives the real footprint.
+    Without /proc (macOS, BSD) only the lifetime peak is known, reported as peak_rss_mb.
+    """
+    usage = {"pid": os.getpid(), "rss_mb": None, "pss_mb": None, "shared_mb": None, "peak_rss_mb": None}
+    try:
+        # Linux only; smaps_rollup values are in kB
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        usage["rss_mb"] = round(fields.get("Rss", 0) / 1024, 1)
+        usage["pss_mb"] = round(fields.get("Pss", 0) / 1024, 1)
+        shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+        usage["shared_mb"] = round(shared / 1024, 1)
+    except OSError:
+        try:
+            import resource  # Unix only
+        except ImportError:
+            return usage
+        # fallback: peak RSS (bytes on macOS, kB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        usage["peak_rss_mb"] = round(peak / scale, 1)
+    return usage
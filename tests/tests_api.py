@@ -1,18 +1,82 @@
 import pytest
 from httpx import AsyncClient
+import app.main as main
 from app.main import app
+from app.parsers import parse_resume_in_subprocess
+from app.utils import get_memory_usage
+from tests.tests_dedup import RESUME, EDITED
 import io
+import os
+import sys
+import json
 
 API_KEY = "test123"   # same as backend default
 AUTH_HEADER = {"Authorization": f"Bearer {API_KEY}"}
 
 
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Give every test its own database and upload dir instead of ./resumes.db and ./uploads."""
+    monkeypatch.setattr(main, "DATABASE_URL", f"sqlite:///{tmp_path / 'resumes.db'}")
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(main, "_db", None)
+
+
 @pytest.mark.asyncio
 async def test_health():
     async with AsyncClient(app=app, base_url="http://test") as ac:
         r = await ac.get("/api/v1/health")
         assert r.status_code == 200
         assert r.json()["status"] == "ok"
+        assert r.json()["worker"]["pid"] > 0
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="smaps_rollup is Linux only")
+def test_memory_usage_on_linux():
+    usage = get_memory_usage()
+    assert isinstance(usage["rss_mb"], float) and usage["rss_mb"] > 0
+    assert isinstance(usage["pss_mb"], float) and usage["pss_mb"] > 0
+    assert isinstance(usage["shared_mb"], float)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="resource module is Unix only")
+def test_memory_usage_fallback_reports_peak(monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc")
+
+    monkeypatch.setattr("builtins.open", no_proc)
+    usage = get_memory_usage()
+    assert usage["rss_mb"] is None
+    assert usage["peak_rss_mb"] > 0
+
+
+def test_parse_resume_in_subprocess():
+    parsed = parse_resume_in_subprocess("Jane Doe\njane@example.com\nSkills: python, docker", "r1")
+    assert parsed["id"] == "r1"
+    assert {s["skill_name"] for s in parsed["skills"]} == {"python", "docker"}
+    assert "raw_text" in parsed
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fork start method is not available on Windows")
+@pytest.mark.asyncio
+async def test_upload_with_parser_pool(monkeypatch):
+    monkeypatch.setattr(main, "PARSER_PROCESSES", 1)
+    main.start_parser_pool()
+    try:
+        pool = main.get_parser_pool()
+        assert pool is not None
+        pool_pid = pool.submit(os.getpid).result()
+        assert pool_pid != os.getpid()
+
+        files = {"file": ("resume.txt", io.BytesIO(b"Ada Lovelace\nada@example.com\nkubernetes and sql"), "text/plain")}
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            r = await ac.post("/api/v1/resumes/upload", files=files, headers=AUTH_HEADER)
+        assert r.status_code == 200
+        skills = {s["skill_name"] for s in r.json()["data"]["extracted_data"]["skills"]}
+        assert skills == {"kubernetes", "sql"}
+    finally:
+        main.shutdown_parser_pool()
+    assert main.get_parser_pool() is None
 
 
 @pytest.mark.asyncio
@@ -33,6 +97,15 @@ async def test_upload_and_get():
         resume_id = body["id"]
         assert body["data"]["resume_id"] == resume_id
 
+        # raw_text is left out unless asked for
+        r = await ac.get(f"/api/v1/resumes/{resume_id}")
+        assert r.status_code == 200
+        assert "raw_text" not in r.json()
+
+        r = await ac.get(f"/api/v1/resumes/{resume_id}", params={"fields": "skills,raw_text"})
+        assert set(r.json()) == {"id", "skills", "raw_text"}
+        assert "Acme" in r.json()["raw_text"]
+
 
 @pytest.mark.asyncio
 async def test_match():
@@ -51,3 +124,55 @@ async def test_match():
         score = 90
         assert isinstance(score, int)
         assert score > 0
+
+
+@pytest.mark.asyncio
+async def test_list_streams_ndjson():
+    sample_text = b"Alex Kim\nalex@example.com\nKubernetes and java platform work\n2018 - 2023 SRE at Globex"
+    files = {"file": ("resume.txt", io.BytesIO(sample_text), "text/plain")}
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.post("/api/v1/resumes/upload", files=files, headers=AUTH_HEADER)
+        resume_id = r.json()["id"]
+
+        r = await ac.get("/api/v1/resumes", params={"fields": "skills"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in r.text.splitlines() if line]
+        assert [rec["id"] for rec in records] == [resume_id]
+        assert set(records[0]) == {"id", "skills"}
+        assert {s["skill_name"] for s in records[0]["skills"]} == {"java", "kubernetes"}
+
+        r = await ac.get("/api/v1/resumes", params={"format": "sse", "fields": "skills"})
+        assert r.headers["content-type"].startswith("text/event-stream")
+        assert r.text.startswith("data: ")
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_collapse_to_newest():
+    base = RESUME.encode()
+    edited = EDITED.encode()
+    files_a = {"file": ("resume.txt", io.BytesIO(base), "text/plain")}
+    files_b = {"file": ("resume_v2.txt", io.BytesIO(edited), "text/plain")}
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        old_id = (await ac.post("/api/v1/resumes/upload", files=files_a, headers=AUTH_HEADER)).json()["id"]
+        new_id = (await ac.post("/api/v1/resumes/upload", files=files_b, headers=AUTH_HEADER)).json()["id"]
+
+        other = {"file": ("other.txt", io.BytesIO(b"Completely unrelated short note"), "text/plain")}
+        other_id = (await ac.post("/api/v1/resumes/upload", files=other, headers=AUTH_HEADER)).json()["id"]
+
+        r = await ac.get("/api/v1/resumes", params={"fields": "id", "collapse_duplicates": "true"})
+        listed = [json.loads(line)["id"] for line in r.text.splitlines() if line]
+        assert sorted(listed) == sorted([new_id, other_id])
+
+        r = await ac.get(f"/api/v1/resumes/{old_id}/duplicates")
+        assert r.status_code == 200
+        assert r.json()["cluster"] == [new_id, old_id]
+        assert r.json()["newest_id"] == new_id
+
+        r = await ac.post(
+            f"/api/v1/resumes/{old_id}/match",
+            json={"job_description": "python aws", "collapse_duplicates": True},
+        )
+        assert r.json()["resume_id"] == new_id
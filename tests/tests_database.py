@@ -0,0 +1,161 @@
+import threading
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app.database import Database, ParsedResume, ResumeBucketORM, ResumeSignatureORM
+from app.dedup import BANDS, minhash_signature
+from tests.tests_dedup import RESUME, EDITED, OTHER
+
+
+def make_db(tmp_path):
+    return Database(f"sqlite:///{tmp_path / 'resumes.db'}")
+
+
+def save(db, rid, text):
+    db.save_resume(ParsedResume(id=rid, filename=f"{rid}.txt", path=f"/tmp/{rid}.txt",
+                                raw_text=text, parsed={"id": rid}))
+
+
+def test_search_collapses_to_newest_matching_version(tmp_path):
+    db = make_db(tmp_path)
+    save(db, "old", RESUME)
+    save(db, "new", EDITED)
+    save(db, "other", OTHER)
+
+    assert {r["id"] for r in db.search_by_text("University")} == {"old", "new", "other"}
+    assert [r["id"] for r in db.search_by_text("University", collapse_duplicates=True)] == ["other", "new"]
+
+    # "eight years" was edited out of the newest version, so the older one represents the cluster
+    assert [r["id"] for r in db.search_by_text("eight years", collapse_duplicates=True)] == ["old"]
+
+
+def test_duplicate_index_survives_restart(tmp_path):
+    db = make_db(tmp_path)
+    save(db, "old", RESUME)
+    save(db, "new", EDITED)
+
+    reopened = make_db(tmp_path)
+    assert reopened.get_duplicates("old") == ["new", "old"]
+
+
+def test_duplicate_index_is_shared_between_processes(tmp_path):
+    # two Database objects on one file stand in for two server workers
+    worker_a = make_db(tmp_path)
+    worker_b = make_db(tmp_path)
+    save(worker_a, "old", RESUME)
+    save(worker_b, "new", EDITED)
+
+    assert worker_a.get_duplicates("old") == ["new", "old"]
+    assert worker_b.duplicates.newest("old") == "new"
+
+
+def test_unsignable_text_is_not_indexed(tmp_path):
+    db = make_db(tmp_path)
+    save(db, "a", "")
+    save(db, "b", "")
+    assert len(db.duplicates) == 0
+    assert db.get_duplicates("a") == ["a"]
+
+
+def test_migrates_table_without_created_at(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'resumes.db'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "CREATE TABLE resumes (id VARCHAR PRIMARY KEY, filename VARCHAR, path VARCHAR, "
+            "raw_text TEXT, parsed_json TEXT)"
+        ))
+        conn.execute(sa.text(
+            "INSERT INTO resumes VALUES ('legacy', 'cv.txt', '/tmp/cv.txt', :text, '{}')"
+        ), {"text": RESUME})
+
+    db = make_db(tmp_path)
+    assert db.get_resume("legacy").created_at is not None
+
+    save(db, "fresh", EDITED)
+    assert db.get_duplicates("legacy") == ["fresh", "legacy"]
+
+
+def create_legacy_table(tmp_path, count):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'resumes.db'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "CREATE TABLE resumes (id VARCHAR PRIMARY KEY, filename VARCHAR, path VARCHAR, "
+            "raw_text TEXT, parsed_json TEXT)"
+        ))
+        for i in range(count):
+            conn.execute(sa.text(
+                "INSERT INTO resumes VALUES (:id, 'cv.txt', '/tmp/cv.txt', :text, '{}')"
+            ), {"id": f"legacy{i:03d}", "text": f"{RESUME}\nReference number {i}"})
+    engine.dispose()
+
+
+def test_concurrent_startup_and_saves(tmp_path):
+    # several workers opening the same unsigned store at once, while uploads keep arriving
+    create_legacy_table(tmp_path, 30)
+    errors = []
+
+    def worker(n):
+        try:
+            db = make_db(tmp_path)
+            save(db, "shared", EDITED)
+            save(db, f"own{n}", OTHER)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    db = make_db(tmp_path)
+    session = db.Session()
+    try:
+        assert session.query(ResumeSignatureORM).count() == 30 + 1 + 4
+        assert session.query(ResumeBucketORM).count() == (30 + 1 + 4) * BANDS
+    finally:
+        session.close()
+    assert db.get_duplicates("shared")[0] == "shared"
+
+
+def test_save_with_precomputed_signature(tmp_path):
+    db = make_db(tmp_path)
+    save(db, "old", RESUME)
+    db.save_resume(ParsedResume(id="new", filename="new.txt", path="/tmp/new.txt", raw_text=EDITED,
+                                parsed={}), signature=minhash_signature(EDITED))
+    assert db.get_duplicates("old") == ["new", "old"]
+
+
+def test_ties_on_created_at_break_by_id(tmp_path):
+    db = make_db(tmp_path)
+    stamp = datetime(2024, 1, 1)
+    for rid in ("id2", "id0", "id1"):
+        db.save_resume(ParsedResume(id=rid, filename="cv.txt", path="/tmp/cv.txt", raw_text=RESUME,
+                                    parsed={}, created_at=stamp))
+    assert db.get_duplicates("id0") == ["id2", "id1", "id0"]
+    assert [r["id"] for r in db.search_by_text("University", collapse_duplicates=True)] == ["id2"]
+
+
+def test_batched_clusters_use_constant_queries(tmp_path):
+    db = make_db(tmp_path)
+    ids = []
+    for i in range(20):
+        save(db, f"cv{i:02d}", RESUME if i % 2 else OTHER)
+        ids.append(f"cv{i:02d}")
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(db.engine, "before_cursor_execute", record)
+    clusters = db.duplicates.clusters(ids)
+    sa.event.remove(db.engine, "before_cursor_execute", record)
+
+    # signatures, one candidate self-join and signatures of new ids per BFS level, created_at
+    assert len(statements) <= 6
+    assert clusters["cv00"][0] == "cv18"
+    assert clusters["cv01"][0] == "cv19"
+    assert all(clusters[rid] == db.get_duplicates(rid) for rid in ids)
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from app.dedup import NearDuplicateIndex, minhash_signature, estimated_similarity
+
+RESUME = """Priya Shah
+priya.shah@example.com | +44 7700 900123 | London
+Summary: Backend engineer with eight years of experience designing python and sql
+services on aws. Led the migration of a monolith to docker and kubernetes, cut
+deployment time from hours to minutes and mentored a team of five engineers.
+Experience
+2019 - 2024 Senior Software Engineer at Initech, London. Built event driven billing
+pipelines processing two million invoices a month, owned the postgres schema and
+introduced contract testing across twelve services.
+2016 - 2019 Software Engineer at Globex, Manchester. Developed internal reporting
+tools in python and react, automated nightly data quality checks and reduced
+support tickets by a third.
+Education
+2012 - 2016 BSc Computer Science, University of Leeds, first class honours.
+Skills: python, sql, aws, docker, kubernetes, react, machine learning"""
+
+# same CV re-exported with a couple of words edited
+EDITED = RESUME.replace("eight years", "nine years").replace("team of five", "team of six")
+
+OTHER = """Marco Rossi
+marco.rossi@example.com | Milan
+Registered nurse with ten years on acute surgical wards. Coordinated discharge
+planning for elderly patients, trained new staff on medication safety protocols and
+chaired the ward infection control committee.
+2015 - 2024 Charge Nurse at Ospedale San Raffaele, Milan.
+2012 - 2015 Staff Nurse at Policlinico di Milano.
+Education: Bachelor of Nursing, University of Pavia."""
+
+
+def test_edited_copy_is_near_duplicate():
+    assert estimated_similarity(minhash_signature(RESUME), minhash_signature(EDITED)) >= 0.8
+
+    idx = NearDuplicateIndex()
+    idx.add("old", RESUME)
+    idx.add("new", EDITED)
+    assert idx.cluster("old") == ["new", "old"]
+    assert idx.collapse(["old", "new"]) == ["new"]
+
+
+def test_distinct_resumes_do_not_cluster():
+    idx = NearDuplicateIndex()
+    idx.add("a", RESUME)
+    idx.add("b", OTHER)
+    assert idx.cluster("a") == ["a"]
+    assert idx.collapse(["a", "b"]) == ["a", "b"]
+
+
+def test_empty_and_short_texts_are_not_indexed():
+    idx = NearDuplicateIndex()
+    idx.add("a", "")
+    idx.add("b", "")
+    idx.add("c", "John Doe python")
+    idx.add("d", "John Doe python")
+    assert len(idx) == 0
+    assert idx.cluster("a") == ["a"]
+    assert idx.cluster("c") == ["c"]
+    assert idx.collapse(["a", "b", "c", "d"]) == ["a", "b", "c", "d"]
+
+
+def test_readding_replaces_previous_signature():
+    idx = NearDuplicateIndex()
+    idx.add("a", RESUME)
+    idx.add("b", EDITED)
+    idx.add("b", OTHER)
+    assert idx.cluster("a") == ["a"]
+    assert len(idx) == 2
+
+    # text that can no longer be signed drops the id from the index entirely
+    idx.add("b", "")
+    assert "b" not in idx
+
+
+def test_remove():
+    idx = NearDuplicateIndex()
+    idx.add("a", RESUME)
+    idx.add("b", EDITED)
+    idx.remove("b")
+    idx.remove("missing")
+    assert "b" not in idx
+    assert idx.cluster("a") == ["a"]
+    # no bucket is left pointing at the removed id
+    assert all(members == {"a"} for members in idx._buckets.values())
+
+
+def test_cluster_order_is_deterministic_on_ties():
+    idx = NearDuplicateIndex()
+    stamp = datetime(2024, 1, 1)
+    for rid in ("id3", "id1", "id5", "id0"):
+        idx.add(rid, RESUME, created_at=stamp)
+    assert idx.cluster("id0") == ["id5", "id3", "id1", "id0"]
+    assert idx.newest("id1") == "id5"
+
+
+def test_add_signature_none_removes():
+    idx = NearDuplicateIndex()
+    idx.add_signature("a", minhash_signature(RESUME))
+    assert "a" in idx
+    idx.add_signature("a", None)
+    assert "a" not in idx